@@ -210,3 +210,91 @@ def test_delitem_nested():
     assert ("key2", "nested_key2") in cm.keys()
     assert ("key2", "another_dict_key", "bool") in cm.keys()
     assert ("key2", "another_dict_key", "hello") not in cm.keys()
+
+
+def test_sort_keys():
+    d = {"b": 1, "a": {"list": list(range(11)), "z": 2, "c": 3}}
+    cm = Splitter(d)
+    assert cm.keys()[0] == ("b",)
+
+    cm = Splitter(d, sort_keys=True)
+    assert cm.keys()[0] == ("a", "c")
+    assert cm.keys()[1:12] == [("a", "list", f"*{i}") for i in range(11)]
+    assert cm.keys()[-1] == ("b",)
+
+    assert list(Splitter(d).sorted_items()) == list(cm.items())
+
+
+def test_query():
+    cm = Splitter(example_nested_dict_with_list_values)
+
+    assert dict(cm.query("nested_key.list_key.*#")) == {
+        ("nested_key", "list_key", f"*{i}"): i for i in range(6)
+    }
+    assert list(cm.query("*.simple_key")) == [
+        (("nested_key", "simple_key"), "simple_value")
+    ]
+    assert list(cm.query("**.ps")) == [
+        (("nested_key", "list_key", "*6", "ps"), "s")
+    ]
+    assert len(list(cm.query("nested_key.**"))) == 8
+    assert len(list(cm.query("**.**"))) == len(cm)
+    assert list(cm.query("key")) == [(("key",), "value")]
+    assert list(cm.query("nested_key")) == []
+
+    cm["nested_key.new"] = 1
+    assert list(cm.query("*.new")) == [(("nested_key", "new"), 1)]
+
+
+def test_get_many():
+    cm = Splitter(example_nested_dict_with_list_values)
+    paths = [
+        "nested_key.list_key.*6.ps",
+        ("key",),
+        "nested_key.list_key.*2",
+        "nested_key",
+        "nested_key.list_key.*9",
+        "nested_key.simple_key",
+    ]
+    assert cm.get_many(paths) == [
+        cm[path] if i not in (3, 4) else None for i, path in enumerate(paths)
+    ]
+    assert cm.get_many(["missing", "key"], default=0) == [0, "value"]
+
+
+def test_set_many():
+    cm = Splitter(dict_={"a": 1, "b": {"c": 2}})
+    cm.set_many(
+        {
+            "a.x": 1,
+            "b.d": 3,
+            ("list", "*10"): 10,
+            **{f"list.*{i}": i for i in range(10)},
+            "nested.*0.key": "value",
+            "nested.*1.*0": "item",
+        }
+    )
+    assert cm.as_dict() == {
+        "a": {"x": 1},
+        "b": {"c": 2, "d": 3},
+        "list": list(range(11)),
+        "nested": [{"key": "value"}, ["item"]],
+    }
+
+
+def test_query_after_nested_mutation():
+    cm = Splitter({"a": {}})
+    assert list(cm.query("**")) == [(("a",), {})]
+
+    cm["a"]["x"] = 5
+    assert list(cm.query("a.x")) == [(("a", "x"), 5)]
+
+    index = cm.index()
+    assert list(index.query(("a", "*"))) == [(("a", "x"), 5)]
+
+
+def test_query_matches_index():
+    cm = Splitter(example_nested_dict_with_list_values)
+    index = cm.index()
+    for pattern in ("**", "*.*", "nested_key.list_key.*#", "**.ps", "*.**.*"):
+        assert list(cm.query(pattern)) == list(index.query(pattern.split(".")))
@@ -1,8 +1,19 @@
 import os
 import json
+import math
 import tempfile
-from vocab.splitter import Splitter
+import pytest
+from array import array
+from vocab import streams
+from vocab.splitter import Splitter, Change, ADDED, REMOVED, CHANGED
 from vocab.functions import make_configs
+from vocab.writer import write_json
+from vocab.watch import Structure, watch, _apply
+from vocab.cli.parser import get_parser
+from vocab.export import export
+from vocab.compiler import compile_configs, load_snapshot
+from vocab.bench import Case, generate, run_case, run_bench, format_report
+from vocab.store import load_residuals
 
 
 def test_simple_intersection():
@@ -239,3 +250,483 @@ def test_real_duty2():
 
         assert all([ib1[k] == restored1[k] for k in restored1.keys()])
         assert all([ib2[k] == restored2[k] for k in restored2.keys()])
+
+
+def test_diff():
+    dd1 = Splitter(
+        dict_={"a": "b", "c": {"d": 1, "e": [1, 2]}, "removed": True}
+    )
+    dd2 = Splitter(
+        dict_={"c": {"e": [1, 3], "d": 1}, "a": "b", "added": {"x": "y"}}
+    )
+
+    changes = list(dd1.diff(dd2))
+
+    assert changes == [
+        Change(ADDED, ("added", "x"), new="y"),
+        Change(CHANGED, ("c", "e", "*1"), old=2, new=3),
+        Change(REMOVED, ("removed",), old=True),
+    ]
+    assert list(dd1.diff(dd1)) == []
+
+
+def test_streams():
+    dd1 = Splitter(
+        dict_={"a": "b", "list": list(range(12)), "c": {"d": 1, "e": 2}}
+    )
+    dd2 = Splitter(
+        dict_={"c": {"e": 3, "d": 1}, "list": list(range(12)), "x": "y"}
+    )
+
+    intersection = Splitter.from_items(
+        streams.intersect(dd1.sorted_items(), dd2.sorted_items())
+    )
+    assert sorted(intersection.keys()) == sorted((dd1 ^ dd2).keys())
+
+    residual = Splitter.from_items(
+        streams.subtract(dd1.sorted_items(), dd2.sorted_items())
+    )
+    assert residual.as_dict() == (dd1 - dd2).as_dict()
+
+    merged = Splitter.from_items(
+        streams.merge(dd1.sorted_items(), dd2.sorted_items())
+    )
+    assert merged.as_dict() == {
+        "a": "b",
+        "c": {"d": 1, "e": 3},
+        "list": list(range(12)),
+        "x": "y",
+    }
+
+
+def test_write_json():
+    conf = Splitter(dict_={"a": {"b": [1, {"c": "d"}]}, "big": 2 ** 70})
+    with tempfile.TemporaryDirectory() as temp:
+        path = os.path.join(temp, "out.json")
+        write_json(conf, path, use_orjson=True)
+        with open(path) as f:
+            assert json.loads(f.read()) == conf.as_dict()
+
+        write_json(Splitter(dict_={"x": "y"}), path)
+        with open(path) as f:
+            assert f.read() == json.dumps({"x": "y"})
+
+        write_json(Splitter(dict_={"x": float("nan")}), path, use_orjson=True)
+        with open(path) as f:
+            assert f.read() == '{"x": NaN}'
+        assert os.listdir(temp) == ["out.json"]
+
+
+def test_incremental_structure():
+    structure = Structure()
+    assert structure.update("a.json", Splitter({"x": 1, "y": {"z": [1, 2]}}))
+    assert structure.master_config().as_dict() == {"x": 1, "y": {"z": [1, 2]}}
+    assert structure.residual("a.json").as_dict() == {}
+
+    affected = structure.update("b.json", Splitter({"x": 1, "y": {"z": [1, 3]}}))
+    assert affected == {"a.json", "b.json"}
+    assert structure.master_config().as_dict() == {"x": 1, "y": {"z": [1]}}
+    assert structure.residual("a.json").as_dict() == {"y": {"z": [2]}}
+
+    affected = structure.update("b.json", Splitter({"x": 1, "y": {"z": [1, 4]}}))
+    assert affected == {"b.json"}
+    assert structure.residual("b.json").as_dict() == {"y": {"z": [4]}}
+
+    affected = structure.update("b.json", None)
+    assert affected == {"a.json"}
+    assert "b.json" not in structure.files
+    assert structure.master_config().as_dict() == {"x": 1, "y": {"z": [1, 2]}}
+
+
+def test_export():
+    initial_configs_dir = os.path.join(
+        os.path.dirname(__file__), "files", "configs"
+    )
+    with tempfile.TemporaryDirectory() as temp:
+        rows = export(temp, initial_configs_dir)
+
+        total = 0
+        for name in ("big1.json", "big2.json"):
+            with open(os.path.join(initial_configs_dir, name)) as f:
+                total += len(Splitter(json.loads(f.read())))
+        assert rows == total
+
+        with open(os.path.join(temp, "table.csv")) as f:
+            assert len(f.readlines()) == total + 1
+
+        path_ids = array("I")
+        with open(os.path.join(temp, "path_id.bin"), "rb") as f:
+            path_ids.fromfile(f, total)
+        offsets = array("Q")
+        with open(os.path.join(temp, "value_offset.bin"), "rb") as f:
+            offsets.fromfile(f, total + 1)
+        with open(os.path.join(temp, "values.bin"), "rb") as f:
+            heap = f.read()
+        assert offsets[-1] == len(heap)
+        assert json.loads(heap[offsets[0]:offsets[1]]) == "journal"
+        assert path_ids[0] == 0
+
+
+def test_memory_limit():
+    initial_configs_dir = os.path.join(
+        os.path.dirname(__file__), "files", "configs"
+    )
+    with tempfile.TemporaryDirectory() as temp:
+        make_configs(temp, initial_configs_dir, memory_limit=1024)
+        assert sorted(os.listdir(temp)) == ["big1.json", "big2.json", "master.json"]
+
+        with open(os.path.join(temp, "master.json")) as mf:
+            mc = json.loads(mf.read())
+        assert mc
+
+        for name in ("big1.json", "big2.json"):
+            with open(os.path.join(temp, name)) as bf, open(
+                os.path.join(initial_configs_dir, name)
+            ) as ibf:
+                b = json.loads(bf.read())
+                ib = json.loads(ibf.read())
+
+            restored = (Splitter(mc) + Splitter(b)).as_dict()
+            assert all([ib[k] == restored[k] for k in restored.keys()])
+
+
+def test_compile():
+    initial_configs_dir = os.path.join(os.path.dirname(__file__), "files")
+    with tempfile.TemporaryDirectory() as temp:
+        make_configs(temp, initial_configs_dir)
+        output = os.path.join(temp, "compiled")
+
+        written = compile_configs(temp, output)
+        assert sorted(os.listdir(output)) == ["conf1.snapshot", "conf2.snapshot"]
+
+        with open(os.path.join(initial_configs_dir, "conf1.json")) as f:
+            expected = Splitter(json.loads(f.read()))
+        config = load_snapshot(written[0])
+        assert config == {expected.kd.join(k): v for k, v in expected.items()}
+        assert config["handlers.*0.urlRegex"] == "/.*"
+
+        written = compile_configs(temp, output, fmt="module")
+        namespace = {}
+        with open(written[0]) as f:
+            exec(f.read(), namespace)
+        assert namespace["CONFIG"] == config
+
+
+def test_flat_operators():
+    dd1 = Splitter(dict_={"a": 1, "b": "x", "c": True, "d": 0.5})
+    dd2 = Splitter(dict_={"b": "x", "a": 2, "d": 0.5, "e": ""})
+    assert dd1.is_flat() and dd2.is_flat()
+    assert not Splitter(dict_={"a": {"b": 1}}).is_flat()
+
+    assert (dd1 ^ dd2).underlying == {"b": "x", "d": 0.5}
+    assert (dd1 - dd2).underlying == {"a": 1, "c": True}
+    assert (dd1 + dd2).underlying == {"a": 2, "b": "x", "c": True, "d": 0.5, "e": ""}
+    assert dd1.underlying == {"a": 1, "b": "x", "c": True, "d": 0.5}
+
+    nested = Splitter(dict_={"a": {"x": 1}, "b": "x"})
+    assert (nested + dd2).underlying == {"a": 2, "b": "x", "d": 0.5, "e": ""}
+    assert (nested ^ dd2).underlying == {"b": "x"}
+    assert (nested - dd2).underlying == {"a": {"x": 1}}
+
+
+def test_bench():
+    case = Case(files=2, leaves=10, depth=2, value_size=4, overlap=0.5)
+    with tempfile.TemporaryDirectory() as temp:
+        generate(temp, case)
+        assert sorted(os.listdir(temp)) == ["conf0.json", "conf1.json"]
+        with open(os.path.join(temp, "conf0.json")) as f1, open(
+            os.path.join(temp, "conf1.json")
+        ) as f2:
+            intersection = Splitter(json.loads(f1.read())) ^ Splitter(
+                json.loads(f2.read())
+            )
+        assert len(intersection) == 5
+
+    results = run_bench(case, "files", [1, 2], repeats=2)
+    assert [result.case.files for result in results] == [2, 4]
+    assert all(result.output_bytes for result in results)
+    assert all(set(result.operators) == {"^", "-"} for result in results)
+    assert "super-linear (struct)" in format_report(
+        [
+            results[0],
+            results[1]._replace(
+                seconds=results[0].seconds * 100, operators=results[0].operators
+            ),
+        ]
+    )
+
+    slow = dict(results[0].operators, **{"^": results[0].operators["^"] * 100})
+    report = format_report(
+        [results[0], results[1]._replace(seconds=results[0].seconds, operators=slow)]
+    )
+    assert "super-linear (^)" in report
+
+    with pytest.raises(ValueError):
+        run_case(case, repeats=0)
+
+
+def test_dedupe():
+    with tempfile.TemporaryDirectory() as scan_dir, tempfile.TemporaryDirectory(
+    ) as temp:
+        for name, conf in (
+            ("a.json", {"x": 1, "y": 2}),
+            ("b.json", {"x": 1, "y": 2}),
+            ("c.json", {"x": 1, "y": 3}),
+        ):
+            with open(os.path.join(scan_dir, name), "w") as f:
+                f.write(json.dumps(conf))
+
+        make_configs(temp, scan_dir, compression="gzip")
+        assert sorted(os.listdir(temp)) == [".store", "master.json"]
+        assert len(os.listdir(os.path.join(temp, ".store", "blobs"))) == 2
+
+        residuals = dict(load_residuals(temp))
+        assert residuals["a.json"].as_dict() == {"y": 2}
+        assert residuals["c.json"].as_dict() == {"y": 3}
+
+        make_configs(temp, scan_dir, memory_limit=64, dedupe=True)
+        blobs = os.listdir(os.path.join(temp, ".store", "blobs"))
+        assert len(blobs) == 2
+        assert all(blob.endswith(".json") for blob in blobs)
+
+        make_configs(temp, scan_dir)
+        assert sorted(os.listdir(temp)) == [
+            "a.json", "b.json", "c.json", "master.json"
+        ]
+        assert dict(load_residuals(temp))["b.json"].as_dict() == {"y": 2}
+
+        make_configs(temp, scan_dir, compression="gzip")
+        with pytest.raises(ValueError):
+            watch(temp, scan_dir)
+        assert sorted(os.listdir(temp)) == [".store", "master.json"]
+
+        args = get_parser().parse_args(
+            ["struct", "-d", scan_dir, "--watch", "--compression", "gzip"]
+        )
+        with pytest.raises(ValueError):
+            args.func(args)
+
+
+def test_diff_types():
+    dd1 = Splitter(dict_={"x": 1, "y": 0, "z": 1.0, "same": 2})
+    dd2 = Splitter(dict_={"x": True, "y": False, "z": 1, "same": 2})
+
+    assert list(dd1.diff(dd2)) == [
+        Change(CHANGED, ("x",), old=1, new=True),
+        Change(CHANGED, ("y",), old=0, new=False),
+        Change(CHANGED, ("z",), old=1.0, new=1),
+    ]
+
+
+def test_incremental_structure_types():
+    structure = Structure()
+    structure.update("a.json", Splitter({"x": True, "y": 1}))
+    structure.update("b.json", Splitter({"x": 1, "y": 1}))
+
+    assert structure.master_config().as_dict() == {"y": 1}
+    assert structure.residual("b.json").as_dict() == {"x": 1}
+    assert structure.residual("a.json").as_dict() == {"x": True}
+
+    assert not structure.master_changed
+    structure.update("b.json", Splitter({"x": 2, "y": 1}))
+    assert not structure.master_changed
+    structure.update("b.json", Splitter({"x": 2, "y": 2}))
+    assert structure.master_changed
+
+
+def test_compile_module_edge_cases():
+    with tempfile.TemporaryDirectory() as temp:
+        with open(os.path.join(temp, "master.json"), "w") as f:
+            f.write('{"inf": Infinity, "nan": NaN}')
+        for name in ("a-b.json", "a_b.json"):
+            with open(os.path.join(temp, name), "w") as f:
+                f.write('{"x": -Infinity}')
+
+        output = os.path.join(temp, "compiled")
+        with pytest.raises(ValueError):
+            compile_configs(temp, output, fmt="module")
+        assert not os.path.exists(output)
+
+        os.remove(os.path.join(temp, "a_b.json"))
+        written = compile_configs(temp, output, fmt="module")
+        namespace = {}
+        with open(written[0]) as f:
+            exec(f.read(), namespace)
+        assert namespace["CONFIG"]["inf"] == float("inf")
+        assert namespace["CONFIG"]["x"] == float("-inf")
+        assert math.isnan(namespace["CONFIG"]["nan"])
+
+
+def _failing_struct(target_dir, scan_dir):
+    raise RuntimeError("boom")
+
+
+def test_bench_failure():
+    case = Case(files=2, leaves=10, depth=2, value_size=4)
+    result = run_case(case, func=_failing_struct)
+
+    assert result.seconds is None
+    assert "RuntimeError: boom" in result.error
+    assert "FAILED: RuntimeError: boom" in format_report([result])
+
+
+def test_diff_command(capsys):
+    files_dir = os.path.join(os.path.dirname(__file__), "files")
+    conf1 = os.path.join(files_dir, "conf1.json")
+    conf2 = os.path.join(files_dir, "conf2.json")
+
+    args = get_parser().parse_args(["diff", conf1, conf1])
+    args.func(args)
+    assert capsys.readouterr().out == ""
+
+    args = get_parser().parse_args(["diff", conf1, conf2])
+    with pytest.raises(SystemExit) as e:
+        args.func(args)
+    assert e.value.code == 1
+    assert "~ threadsafe: true -> false" in capsys.readouterr().out
+
+
+def test_make_configs_orjson():
+    initial_configs_dir = os.path.join(os.path.dirname(__file__), "files")
+    with tempfile.TemporaryDirectory() as plain, tempfile.TemporaryDirectory(
+    ) as fast:
+        make_configs(plain, initial_configs_dir)
+        make_configs(fast, initial_configs_dir, use_orjson=True)
+        for name in ("master.json", "conf1.json", "conf2.json"):
+            with open(os.path.join(plain, name)) as f1, open(
+                os.path.join(fast, name)
+            ) as f2:
+                assert json.loads(f1.read()) == json.loads(f2.read())
+
+
+def test_watch_apply_skips_broken_files():
+    with tempfile.TemporaryDirectory() as scan_dir, tempfile.TemporaryDirectory(
+    ) as temp:
+        for name, data in (
+            ("a.json", '{"x": 1}'),
+            ("list.json", "[1, 2]"),
+            ("broken.json", '{"x":'),
+        ):
+            with open(os.path.join(scan_dir, name), "w") as f:
+                f.write(data)
+
+        structure = Structure()
+        names = ["a.json", "broken.json", "gone.json", "list.json"]
+        _apply(structure, temp, scan_dir, names, force=True)
+        assert list(structure.files) == ["a.json"]
+        assert sorted(os.listdir(temp)) == ["a.json", "master.json"]
+
+        os.remove(os.path.join(scan_dir, "a.json"))
+        _apply(structure, temp, scan_dir, ["a.json"])
+        assert structure.files == {}
+        assert os.listdir(temp) == ["master.json"]
+
+
+def test_modes_agree_on_types():
+    dd1 = Splitter(dict_={"x": 1, "y": "s"})
+    dd2 = Splitter(dict_={"x": True, "y": "s"})
+    assert (dd1 ^ dd2).underlying == {"y": "s"}
+    assert (dd1 - dd2).underlying == {"x": 1}
+
+    nested1 = Splitter(dict_={"a": {"x": 1}, "y": "s"})
+    nested2 = Splitter(dict_={"a": {"x": 1.0}, "y": "s"})
+    assert (nested1 ^ nested2).as_dict() == {"y": "s"}
+    assert (nested1 - nested2).as_dict() == {"a": {"x": 1}}
+
+    with tempfile.TemporaryDirectory() as scan_dir:
+        for name, data in (
+            ("a.json", {"x": 1, "y": "s"}),
+            ("b.json", {"x": True, "y": "s"}),
+            ("c.json", {"y": "s"}),
+        ):
+            with open(os.path.join(scan_dir, name), "w") as f:
+                json.dump(data, f)
+
+        masters = []
+        for kwargs in ({}, {"memory_limit": 64}):
+            with tempfile.TemporaryDirectory() as temp:
+                make_configs(temp, scan_dir, **kwargs)
+                with open(os.path.join(temp, "master.json")) as f:
+                    masters.append(json.load(f))
+
+        with tempfile.TemporaryDirectory() as temp:
+            _apply(
+                Structure(), temp, scan_dir, sorted(os.listdir(scan_dir)), force=True
+            )
+            with open(os.path.join(temp, "master.json")) as f:
+                masters.append(json.load(f))
+
+        assert masters == [{"y": "s"}] * 3
+
+
+def test_make_configs_empty_intersection():
+    with tempfile.TemporaryDirectory() as scan_dir, tempfile.TemporaryDirectory(
+    ) as temp:
+        for name, data in (
+            ("a.json", {"x": 1}),
+            ("b.json", {"y": 2}),
+            ("c.json", {"y": 2}),
+        ):
+            with open(os.path.join(scan_dir, name), "w") as f:
+                json.dump(data, f)
+
+        make_configs(temp, scan_dir)
+        with open(os.path.join(temp, "master.json")) as f:
+            assert json.load(f) == {}
+
+
+def test_nested_operators():
+    dd1 = Splitter(
+        dict_={"a": {"b": {"c": 1, "d": "x"}, "e": {}}, "l": [[1, 2], {"m": 3}]}
+    )
+    dd2 = Splitter(
+        dict_={"a": {"b": {"c": True, "d": "x"}, "e": {}}, "l": [[1, 2], {"m": 4}]}
+    )
+    assert (dd1 ^ dd2).as_dict() == {"a": {"b": {"d": "x"}, "e": {}}, "l": [[1, 2]]}
+    assert (dd1 - dd2).as_dict() == {"a": {"b": {"c": 1}}, "l": [{"m": 3}]}
+    assert (dd1 ^ dd1).as_dict() == dd1.as_dict()
+
+    # results don't share containers with the operands
+    common = dd1 ^ dd2
+    common["a.e.f"] = 1
+    assert dd1.underlying["a"]["e"] == {}
+
+
+def test_setitem_in_place():
+    dd = Splitter(dict_={"a": {"b": 1}, "c": 2})
+    nested = dd.underlying["a"]
+    dd["a.d.e"] = "x"
+    dd["c.f"] = 3
+    assert nested is dd.underlying["a"]
+    assert dd.as_dict() == {"a": {"b": 1, "d": {"e": "x"}}, "c": {"f": 3}}
+
+
+def test_reserved_names():
+    with tempfile.TemporaryDirectory() as scan_dir:
+        for name, conf in (
+            ("index.json", {"x": 1, "y": 2}),
+            ("svc.json", {"x": 1, "y": 3}),
+        ):
+            with open(os.path.join(scan_dir, name), "w") as f:
+                f.write(json.dumps(conf))
+
+        for kwargs in ({}, {"dedupe": True}, {"dedupe": True, "memory_limit": 64}):
+            with tempfile.TemporaryDirectory() as temp:
+                make_configs(temp, scan_dir, **kwargs)
+                residuals = dict(load_residuals(temp))
+                assert sorted(residuals) == ["index.json", "svc.json"]
+                assert residuals["index.json"].as_dict() == {"y": 2}
+
+        with open(os.path.join(scan_dir, "master.json"), "w") as f:
+            f.write(json.dumps({"x": 1}))
+        with tempfile.TemporaryDirectory() as temp:
+            for kwargs in ({}, {"dedupe": True}, {"memory_limit": 64}):
+                with pytest.raises(ValueError):
+                    make_configs(temp, scan_dir, **kwargs)
+            with pytest.raises(ValueError):
+                watch(temp, scan_dir)
+            assert os.listdir(temp) == []
+
+            structure = Structure()
+            _apply(structure, temp, scan_dir, ["master.json", "svc.json"], force=True)
+            assert list(structure.files) == ["svc.json"]
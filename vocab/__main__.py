@@ -2,8 +2,8 @@ from vocab.cli import parser
 
 
 def main():
-    parser = parser.get_parser()
-    args = parser.parse_args()
+    arg_parser = parser.get_parser()
+    args = arg_parser.parse_args()
     args.func(args)
 
 
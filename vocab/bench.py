@@ -0,0 +1,296 @@
+"""
+Load and scaling harness for `make_configs`.
+
+Generates synthetic config directories, structures each of them in a
+fresh process and reports time, peak RSS and output size, together with
+the time of the `^` and `-` operators on the same configs. Every time is
+the best of several repeats. Growth which is faster than linear in the
+input size is flagged.
+"""
+import os
+import sys
+import json
+import math
+import time
+import queue
+import random
+import tempfile
+import traceback
+import typing as ty
+import multiprocessing
+
+from vocab.functions import make_configs
+from vocab.splitter import Splitter
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+DIMENSIONS = ("files", "leaves", "depth", "value_size")
+
+# time exponent (relative to input bytes) above which growth is flagged
+SUPER_LINEAR = 1.3
+
+# operators timed on the generated configs besides the whole `struct`
+OPERATORS = ("^", "-")
+
+
+class Case(ty.NamedTuple):
+    """Parameters of a single generated directory"""
+    files: int = 10
+    leaves: int = 100
+    depth: int = 3
+    value_size: int = 16
+    overlap: float = 0.8
+
+
+class Result(ty.NamedTuple):
+    """Measurements of a single run, `error` is set if the run has failed"""
+    case: Case
+    input_bytes: int
+    seconds: ty.Optional[float]
+    peak_rss: ty.Optional[int]
+    output_bytes: int
+    error: ty.Optional[str] = None
+    operators: ty.Optional[ty.Dict[str, float]] = None
+
+
+def generate(directory: str, case: Case, seed: int = 0) -> int:
+    """
+    Writes `case.files` configs to the directory, returns their total size.
+    The first `overlap` share of leaves has the same value in every file
+    """
+    rng = random.Random(seed)
+    shared = int(case.leaves * case.overlap)
+    common_values = [_value(rng, case.value_size) for _ in range(shared)]
+
+    total = 0
+    for file_idx in range(case.files):
+        conf: ty.Dict = {}
+        for leaf in range(case.leaves):
+            node = conf
+            for level in range(case.depth - 1):
+                node = node.setdefault(f"n{level}_{leaf % (level + 3)}", {})
+            if leaf < shared:
+                node[f"leaf{leaf}"] = common_values[leaf]
+            else:
+                node[f"leaf{leaf}"] = _value(rng, case.value_size)
+
+        data = json.dumps(conf)
+        with open(os.path.join(directory, f"conf{file_idx}.json"), "w") as f:
+            f.write(data)
+        total += len(data)
+    return total
+
+
+def _value(rng: random.Random, size: int) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(size))
+
+
+def _dir_size(directory: str) -> int:
+    return sum(
+        entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()
+    )
+
+
+def _best(func: ty.Callable, repeats: int) -> float:
+    best = math.inf
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _load(scan_dir: str) -> ty.List[Splitter]:
+    configs = []
+    for file in sorted(os.listdir(scan_dir)):
+        with open(os.path.join(scan_dir, file), "r") as f:
+            configs.append(Splitter(dict_=json.loads(f.read())))
+    return configs
+
+
+def _time_operators(scan_dir: str, repeats: int) -> ty.Dict[str, float]:
+    """
+    Times `^` folded over all configs, the way `make_configs` builds the
+    master, and `-` of the master from every config
+    """
+    configs = _load(scan_dir)
+    master = configs[0]
+    for conf in configs[1:]:
+        master = master ^ conf
+
+    def intersect():
+        common = configs[0]
+        for conf in configs[1:]:
+            common = common ^ conf
+
+    def subtract():
+        for conf in configs:
+            conf - master
+
+    return {"^": _best(intersect, repeats), "-": _best(subtract, repeats)}
+
+
+def _struct(
+    target_dir: str,
+    scan_dir: str,
+    results: multiprocessing.Queue,
+    func: ty.Callable,
+    repeats: int,
+) -> None:
+    try:
+        seconds = _best(lambda: func(target_dir, scan_dir), repeats)
+        # taken before the operators run, so it describes `func` only
+        peak_rss = _peak_rss()
+        operators = _time_operators(scan_dir, repeats)
+    except BaseException:
+        results.put((None, None, None, traceback.format_exc()))
+        return
+
+    results.put((seconds, peak_rss, operators, None))
+
+
+def _peak_rss() -> ty.Optional[int]:
+    # On Linux ru_maxrss survives exec, so a spawned worker would still
+    # report the high-water mark of its parent. VmHWM belongs to the
+    # address space of the current program only
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+    return peak_rss
+
+
+def run_case(
+    case: Case, seed: int = 0, func: ty.Callable = make_configs, repeats: int = 3
+) -> Result:
+    """
+    Generates the case and runs `func(target_dir, scan_dir)` on it, keeping
+    the best time of `repeats` runs. The runs happen in a freshly spawned
+    process, so that its peak RSS doesn't include memory of the current one
+    """
+    if repeats < 1:
+        raise ValueError(f"At least one repeat is required, got {repeats}")
+
+    with tempfile.TemporaryDirectory() as scan_dir, tempfile.TemporaryDirectory(
+    ) as target_dir:
+        input_bytes = generate(scan_dir, case, seed=seed)
+
+        context = multiprocessing.get_context("spawn")
+        results: multiprocessing.Queue = context.Queue()
+        process = context.Process(
+            target=_struct, args=(target_dir, scan_dir, results, func, repeats)
+        )
+        process.start()
+        while True:
+            try:
+                seconds, peak_rss, operators, error = results.get(timeout=0.5)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    seconds, peak_rss, operators = None, None, None
+                    error = f"Worker exited with code {process.exitcode}"
+                    break
+        process.join()
+        return Result(
+            case,
+            input_bytes,
+            seconds,
+            peak_rss,
+            _dir_size(target_dir),
+            error,
+            operators,
+        )
+
+
+def run_bench(
+    base: Case, vary: str, steps: ty.Iterable[int], repeats: int = 3
+) -> ty.List[Result]:
+    """Runs the base case with the `vary` dimension multiplied by each step"""
+    if vary not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension `{vary}`, expected one of {DIMENSIONS}")
+    return [
+        run_case(base._replace(**{vary: getattr(base, vary) * step}), repeats=repeats)
+        for step in steps
+    ]
+
+
+def _seconds(result: Result, operator: ty.Optional[str]) -> ty.Optional[float]:
+    if operator is None:
+        return result.seconds
+    return (result.operators or {}).get(operator)
+
+
+def exponent(
+    previous: Result, current: Result, operator: ty.Optional[str] = None
+) -> ty.Optional[float]:
+    """
+    Empirical exponent of time growth relative to input size growth, of
+    the whole run or of one of `OPERATORS`
+    """
+    if previous.error or current.error:
+        return None
+    before, after = _seconds(previous, operator), _seconds(current, operator)
+    if not before or not after or current.input_bytes <= previous.input_bytes:
+        return None
+    return math.log(after / before) / math.log(
+        current.input_bytes / previous.input_bytes
+    )
+
+
+def format_report(results: ty.List[Result]) -> str:
+    header = (
+        f"{'files':>7} {'leaves':>7} {'depth':>5} {'vsize':>5} "
+        f"{'input KiB':>10} {'time s':>9} {'^ s':>9} {'- s':>9} "
+        f"{'RSS MiB':>8} {'output KiB':>10} {'exp':>5} {'^ exp':>5} {'- exp':>5}"
+    )
+    lines = [header, "-" * len(header)]
+    for idx, result in enumerate(results):
+        case = result.case
+        params = (
+            f"{case.files:>7} {case.leaves:>7} {case.depth:>5} {case.value_size:>5} "
+            f"{result.input_bytes / 1024:>10.1f}"
+        )
+        if result.error:
+            reason = result.error.strip().splitlines()[-1]
+            lines.append(f"{params}  FAILED: {reason}")
+            continue
+
+        timings = " ".join(
+            _format_number(_seconds(result, name), 9, 3)
+            for name in (None,) + OPERATORS
+        )
+        growths = {
+            name: exponent(results[idx - 1], result, name) if idx else None
+            for name in (None,) + OPERATORS
+        }
+        rss = f"{result.peak_rss / 1024 ** 2:.1f}" if result.peak_rss else "n/a"
+        flagged = [
+            name or "struct"
+            for name, growth in growths.items()
+            if growth is not None and growth > SUPER_LINEAR
+        ]
+        flag = f"  <- super-linear ({', '.join(flagged)})" if flagged else ""
+        lines.append(
+            f"{params} {timings} {rss:>8} "
+            f"{result.output_bytes / 1024:>10.1f} "
+            + " ".join(_format_number(growth, 5, 2) for growth in growths.values())
+            + flag
+        )
+    return "\n".join(lines)
+
+
+def _format_number(value: ty.Optional[float], width: int, digits: int) -> str:
+    return f"{'' if value is None else f'{value:.{digits}f}':>{width}}"
@@ -1,5 +1,11 @@
 import os
+import json
+from vocab.bench import Case, run_bench, format_report
+from vocab.compiler import compile_configs
+from vocab.export import export as export_configs
 from vocab.functions import make_configs
+from vocab.watch import watch
+from vocab.splitter import Splitter, ADDED, REMOVED
 
 
 def struct(args):
@@ -8,9 +14,87 @@ def struct(args):
         raise ValueError(f"Directory not found {os.path.abspath(directory)}")
     if not os.path.isdir(directory):
         raise ValueError(f"Given path {os.path.abspath(directory)} is not a valid directory")
+    if args.watch:
+        for flag, value in (
+            ("--dedupe", args.dedupe),
+            ("--compression", args.compression),
+            ("--memory-limit", args.memory_limit),
+        ):
+            if value not in (None, False):
+                raise ValueError(f"`{flag}` can't be combined with `--watch`")
 
     working_dir = os.path.join(os.path.abspath(directory), ".vocab")
     if not os.path.exists(working_dir):
         os.mkdir(working_dir)
 
-    return make_configs(working_dir, directory)
+    if args.watch:
+        return watch(working_dir, directory, use_orjson=args.orjson)
+    return make_configs(
+        working_dir,
+        directory,
+        memory_limit=args.memory_limit,
+        dedupe=args.dedupe,
+        compression=args.compression,
+        use_orjson=args.orjson,
+    )
+
+
+def export(args):
+    directory = args.directory
+    if not os.path.isdir(directory):
+        raise ValueError(f"Given path {os.path.abspath(directory)} is not a valid directory")
+
+    output = args.output or os.path.join(os.path.abspath(directory), ".vocab", "export")
+    rows = export_configs(output, directory)
+    print(f"Exported {rows} rows to {output}")
+
+
+def bench(args):
+    base = Case(
+        files=args.files,
+        leaves=args.leaves,
+        depth=args.depth,
+        value_size=args.value_size,
+        overlap=args.overlap,
+    )
+    results = run_bench(base, args.vary, args.steps, repeats=args.repeats)
+    print(format_report(results))
+    if any(result.error for result in results):
+        raise SystemExit(1)
+
+
+def compile(args):
+    working_dir = os.path.join(os.path.abspath(args.directory), ".vocab")
+    if not os.path.isfile(os.path.join(working_dir, "master.json")):
+        raise ValueError(
+            f"No structured configs found in {working_dir}, run `vocab struct` first"
+        )
+
+    output = args.output or os.path.join(working_dir, "compiled")
+    for path in compile_configs(working_dir, output, fmt=args.format):
+        print(f"Compiled {path}")
+
+
+def diff(args):
+    for file in (args.first, args.second):
+        if not os.path.isfile(file):
+            raise ValueError(f"File not found {os.path.abspath(file)}")
+
+    with open(args.first, "r") as f1, open(args.second, "r") as f2:
+        first = Splitter(dict_=json.loads(f1.read()))
+        second = Splitter(dict_=json.loads(f2.read()))
+
+    changed = False
+    for change in first.diff(second):
+        changed = True
+        path = first.kd.join(change.path)
+        if change.action == ADDED:
+            print(f"+ {path}: {json.dumps(change.new)}")
+        elif change.action == REMOVED:
+            print(f"- {path}: {json.dumps(change.old)}")
+        else:
+            print(f"~ {path}: {json.dumps(change.old)} -> {json.dumps(change.new)}")
+
+    # same convention as diff(1), so CI jobs can rely on the exit status
+    if changed:
+        raise SystemExit(1)
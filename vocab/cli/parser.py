@@ -17,6 +17,26 @@ def partition(pred: ty.Callable, iterable: ty.Iterable):
     return filterfalse(pred, iter_1), filter(pred, iter_2)
 
 
+def parse_size(value: str) -> int:
+    """Parses sizes like `512K`, `64M` or `2G` into a number of bytes"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper().rstrip("B")
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size `{value}`")
+
+
+def parse_list(value: str) -> ty.List[int]:
+    """Parses comma separated integers like `1,2,4,8`"""
+    try:
+        return [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid list of integers `{value}`")
+
+
 def lazy_load_command(import_path: str, func: str) -> ty.Callable:
     """Create a lazy loader for command"""
     _, _, name = import_path.rpartition(".")
@@ -86,14 +106,143 @@ ARG_DIR = Arg(
     help="Path to the directory where perform scan",
     default=os.getcwd()
 )
+ARG_WATCH = Arg(
+    ("-w", "--watch"),
+    help="Keep running and update the output whenever a file changes",
+    action="store_true",
+)
+ARG_OUTPUT = Arg(
+    ("-o", "--output"),
+    help="Path to the output directory, defaults to `.vocab/export`",
+)
+ARG_MEMORY_LIMIT = Arg(
+    ("-m", "--memory-limit"),
+    help="Approximate memory budget, e.g. `256M`. When given, intermediate\n"
+         "data is spilled to temporary files in `.vocab`",
+    type=parse_size,
+)
+ARG_DEDUPE = Arg(
+    ("--dedupe",),
+    help="Store identical residuals once, under `.vocab/.store`",
+    action="store_true",
+)
+ARG_COMPRESSION = Arg(
+    ("-c", "--compression"),
+    help="Compress deduplicated residuals, implies `--dedupe`.\n"
+         "zstd requires the `zstandard` package",
+    choices=("gzip", "zstd"),
+)
+ARG_ORJSON = Arg(
+    ("--orjson",),
+    help="Serialize output with orjson if it is installed. Faster, but keeps\n"
+         "every output file in memory at once and writes compact JSON",
+    action="store_true",
+)
+ARG_COMPILED_OUTPUT = Arg(
+    ("-o", "--output"),
+    help="Path to the output directory, defaults to `.vocab/compiled`",
+)
+ARG_FORMAT = Arg(
+    ("-f", "--format"),
+    help="Snapshot format: a marshal blob or a generated Python module",
+    choices=("marshal", "module"),
+    default="marshal",
+)
+ARG_VARY = Arg(
+    ("--vary",),
+    help="Dimension which grows between the runs",
+    choices=("files", "leaves", "depth", "value_size"),
+    default="files",
+)
+ARG_STEPS = Arg(
+    ("--steps",),
+    help="Comma separated multipliers of the varied dimension",
+    type=parse_list,
+    default=[1, 2, 4, 8],
+)
+ARG_REPEATS = Arg(
+    ("--repeats",),
+    help="Runs of every measurement, the best time is reported",
+    type=int,
+    default=3,
+)
+ARG_FILES = Arg(
+    ("--files",),
+    help="Number of generated configuration files",
+    type=int,
+    default=10,
+)
+ARG_LEAVES = Arg(
+    ("--leaves",),
+    help="Number of leaves in every generated file",
+    type=int,
+    default=100,
+)
+ARG_DEPTH = Arg(
+    ("--depth",),
+    help="Nesting depth of the generated leaves",
+    type=int,
+    default=3,
+)
+ARG_VALUE_SIZE = Arg(
+    ("--value-size",),
+    help="Length of the generated string values",
+    type=int,
+    default=16,
+)
+ARG_OVERLAP = Arg(
+    ("--overlap",),
+    help="Share of leaves which are equal in all files, from 0 to 1",
+    type=float,
+    default=0.8,
+)
+ARG_FIRST = Arg(
+    ("first",),
+    help="Path to the original configuration file",
+)
+ARG_SECOND = Arg(
+    ("second",),
+    help="Path to the configuration file to compare with",
+)
 
 _commands: ty.List[CLICommand] = [
     ActionCommand(
         name="struct",
         help="Structures all found configuration files in the specified directory",
-        func=lazy_load_command("vocab.cli.functions", "struct"),
-        args=(ARG_DIR,)
-    )
+        func=lazy_load_command("vocab.cli.commands", "struct"),
+        args=(
+            ARG_DIR, ARG_COMPRESSION, ARG_DEDUPE,
+            ARG_MEMORY_LIMIT, ARG_ORJSON, ARG_WATCH,
+        )
+    ),
+    ActionCommand(
+        name="diff",
+        help="Shows differences between two configuration files,\n"
+             "exits with status 1 if there are any",
+        func=lazy_load_command("vocab.cli.commands", "diff"),
+        args=(ARG_FIRST, ARG_SECOND)
+    ),
+    ActionCommand(
+        name="bench",
+        help="Measures how `struct` scales on generated configuration files",
+        func=lazy_load_command("vocab.cli.commands", "bench"),
+        args=(
+            ARG_VARY, ARG_STEPS, ARG_REPEATS, ARG_FILES, ARG_LEAVES,
+            ARG_DEPTH, ARG_VALUE_SIZE, ARG_OVERLAP,
+        )
+    ),
+    ActionCommand(
+        name="compile",
+        help="Compiles structured configs into fast-loading resolved snapshots",
+        func=lazy_load_command("vocab.cli.commands", "compile"),
+        args=(ARG_DIR, ARG_COMPILED_OUTPUT, ARG_FORMAT)
+    ),
+    ActionCommand(
+        name="export",
+        help="Exports flattened configuration files as columnar tables",
+        func=lazy_load_command("vocab.cli.commands", "export"),
+        args=(ARG_DIR, ARG_OUTPUT)
+    ),
 ]
 
 ALL_COMMANDS_DICT: ty.Dict[str, CLICommand] = {sp.name: sp for sp in _commands}
@@ -0,0 +1,101 @@
+"""
+Compilation of fully resolved configs.
+
+Every residual in the output directory is merged with the master config
+and stored as a flat `{path: value}` dict, either as a marshal blob or
+as a generated Python module, so that consumers load it in one step:
+
+    config = load_snapshot(".vocab/compiled/service.snapshot")
+    config["handlers.*0.urlRegex"]
+"""
+import os
+import re
+import json
+import math
+import marshal
+import typing as ty
+
+from vocab.splitter import Splitter
+from vocab.store import load_residuals, residual_names
+from vocab.writer import atomic_open
+
+MARSHAL = "marshal"
+MODULE = "module"
+FORMATS = (MARSHAL, MODULE)
+
+
+def resolve(master: Splitter, residual: Splitter) -> ty.Dict[str, ty.Any]:
+    """Merges the residual into the master config and flattens the result"""
+    resolved = master + residual
+    return {resolved.kd.join(k): v for k, v in resolved.items()}
+
+
+def load_snapshot(path: str) -> ty.Dict[str, ty.Any]:
+    """
+    Loads a marshal snapshot. Snapshots are only readable by the same
+    Python version which has written them
+    """
+    with open(path, "rb") as f:
+        return marshal.load(f)
+
+
+def _module_name(name: str) -> str:
+    name = re.sub(r"\W", "_", os.path.splitext(name)[0])
+    return f"_{name}" if name[:1].isdigit() else name
+
+
+def _literal(value: ty.Any) -> str:
+    """Python source of a JSON value, including non-finite floats"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return f'float("{value!r}")'
+    if isinstance(value, list):
+        return "[" + ", ".join(_literal(item) for item in value) + "]"
+    if isinstance(value, dict):
+        items = (f"{k!r}: {_literal(v)}" for k, v in value.items())
+        return "{" + ", ".join(items) + "}"
+    return repr(value)
+
+
+def _read(path: str) -> Splitter:
+    with open(path, "r") as f:
+        return Splitter(dict_=json.loads(f.read()))
+
+
+def compile_configs(
+    target_dir: str, output_dir: str, fmt: str = MARSHAL
+) -> ty.List[str]:
+    """Compiles every residual of `target_dir`, returns written paths"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format `{fmt}`, expected one of {FORMATS}")
+    if fmt == MODULE:
+        # check names before anything is written
+        modules: ty.Dict[str, str] = {}
+        for file in residual_names(target_dir):
+            module = _module_name(file)
+            if module in modules:
+                raise ValueError(
+                    f"Both `{modules[module]}` and `{file}` compile to module `{module}`"
+                )
+            modules[module] = file
+
+    os.makedirs(output_dir, exist_ok=True)
+    master = _read(os.path.join(target_dir, "master.json"))
+
+    written = []
+    for file, residual in load_residuals(target_dir):
+        resolved = resolve(master, residual)
+        if fmt == MARSHAL:
+            out = os.path.join(output_dir, os.path.splitext(file)[0] + ".snapshot")
+            with atomic_open(out) as fp:
+                marshal.dump(resolved, fp)
+        else:
+            out = os.path.join(output_dir, _module_name(file) + ".py")
+            lines = ["# Generated by `vocab compile`, do not edit", "CONFIG = {"]
+            lines.extend(
+                f"    {k!r}: {_literal(resolved[k])}," for k in sorted(resolved)
+            )
+            lines.append("}\n")
+            with atomic_open(out) as fp:
+                fp.write("\n".join(lines).encode("utf-8"))
+        written.append(out)
+    return written
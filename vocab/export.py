@@ -0,0 +1,144 @@
+"""
+Columnar export of flattened configs.
+
+Writes every leaf of every scanned config as a `(file_id, path_id,
+value_type, value)` row, both as CSV and as a set of binary column
+files which can be memory mapped by analytics tools:
+
+    files.csv          file_id,name
+    paths.csv          path_id,path
+    table.csv          file_id,path_id,value_type,value
+    file_id.bin        uint32 column
+    path_id.bin        uint32 column
+    value_type.bin     uint8 column
+    value_offset.bin   uint64 column, offsets of values in `values.bin`,
+                       one extra trailing item marks the end of the heap
+    values.bin         JSON encoded values, UTF-8
+    layout.json        column types, byte order and number of rows
+"""
+import os
+import csv
+import sys
+import json
+import typing as ty
+from array import array
+
+from vocab.splitter import Splitter
+
+CHUNK_SIZE = 64 * 1024
+
+NULL, BOOL, INT, FLOAT, STR, LIST, DICT = range(7)
+
+_COLUMNS = (
+    ("file_id", "I"),
+    ("path_id", "I"),
+    ("value_type", "B"),
+    ("value_offset", "Q"),
+)
+
+
+def value_type(value: ty.Any) -> int:
+    if value is None:
+        return NULL
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, str):
+        return STR
+    if isinstance(value, list):
+        return LIST
+    return DICT
+
+
+class _Columns:
+    """Binary column files with buffered appends"""
+
+    def __init__(self, target_dir: str):
+        self.arrays = {name: array(code) for name, code in _COLUMNS}
+        self.files = {
+            name: open(os.path.join(target_dir, f"{name}.bin"), "wb")
+            for name, _ in _COLUMNS
+        }
+        self.heap = open(os.path.join(target_dir, "values.bin"), "wb")
+        self.offset = 0
+        self.rows = 0
+
+    def append(self, file_id: int, path_id: int, type_: int, value: bytes) -> None:
+        self.arrays["file_id"].append(file_id)
+        self.arrays["path_id"].append(path_id)
+        self.arrays["value_type"].append(type_)
+        self.arrays["value_offset"].append(self.offset)
+        self.heap.write(value)
+        self.offset += len(value)
+        self.rows += 1
+        if len(self.arrays["file_id"]) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        for name, _ in _COLUMNS:
+            self.arrays[name].tofile(self.files[name])
+            del self.arrays[name][:]
+
+    def close(self) -> None:
+        self.arrays["value_offset"].append(self.offset)
+        self.flush()
+        for f in self.files.values():
+            f.close()
+        self.heap.close()
+
+
+def export(target_dir: str, scan_dir: str) -> int:
+    """Exports all configs of `scan_dir` in one pass, returns number of rows"""
+    os.makedirs(target_dir, exist_ok=True)
+    path_ids: ty.Dict[ty.Tuple[str, ...], int] = {}
+    columns = _Columns(target_dir)
+    with open(os.path.join(target_dir, "files.csv"), "w", newline="") as ff, open(
+        os.path.join(target_dir, "paths.csv"), "w", newline=""
+    ) as pf, open(os.path.join(target_dir, "table.csv"), "w", newline="") as tf:
+        files, paths, table = csv.writer(ff), csv.writer(pf), csv.writer(tf)
+        files.writerow(("file_id", "name"))
+        paths.writerow(("path_id", "path"))
+        table.writerow(("file_id", "path_id", "value_type", "value"))
+
+        names = sorted(
+            name
+            for name in os.listdir(scan_dir)
+            if name.endswith(".json") and os.path.isfile(os.path.join(scan_dir, name))
+        )
+        try:
+            for file_id, name in enumerate(names):
+                files.writerow((file_id, name))
+                with open(os.path.join(scan_dir, name), "r") as f:
+                    conf = Splitter(dict_=json.loads(f.read()))
+
+                for path, value in conf.items():
+                    path_id = path_ids.get(path)
+                    if path_id is None:
+                        path_id = path_ids[path] = len(path_ids)
+                        paths.writerow((path_id, conf.kd.join(path)))
+                    type_ = value_type(value)
+                    encoded = json.dumps(value)
+                    table.writerow(
+                        (file_id, path_id, type_, value if type_ == STR else encoded)
+                    )
+                    columns.append(file_id, path_id, type_, encoded.encode("utf-8"))
+        finally:
+            columns.close()
+
+    with open(os.path.join(target_dir, "layout.json"), "w") as lf:
+        lf.write(
+            json.dumps(
+                {
+                    "rows": columns.rows,
+                    "byteorder": sys.byteorder,
+                    "columns": {
+                        name: {"typecode": code, "itemsize": array(code).itemsize}
+                        for name, code in _COLUMNS
+                    },
+                }
+            )
+        )
+    return columns.rows
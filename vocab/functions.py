@@ -1,11 +1,38 @@
 import os
+import sys
 import json
+import heapq
+import shutil
+import tempfile
+import typing as ty
 from pathlib import Path
 from vocab.splitter import Splitter
+from vocab.store import PlainResiduals, ResidualStore, check_names, open_residuals
+from vocab.streams import path_key
+from vocab.writer import write_json
 
+# maximum number of run files merged at once
+MERGE_FAN_IN = 64
 
-def make_configs(target_dir: str, scan_dir: str):
-    master_conf = Splitter(dict_={})
+
+def make_configs(
+    target_dir: str,
+    scan_dir: str,
+    memory_limit: ty.Optional[int] = None,
+    dedupe: bool = False,
+    compression: ty.Optional[str] = None,
+    use_orjson: bool = False,
+):
+    check_names(os.listdir(scan_dir))
+    residuals = open_residuals(
+        target_dir, dedupe=dedupe, compression=compression, use_orjson=use_orjson
+    )
+    if memory_limit is not None:
+        return _make_configs_external(
+            target_dir, scan_dir, memory_limit, residuals, use_orjson=use_orjson
+        )
+
+    master_conf = None
     for file in os.listdir(scan_dir):
         path = os.path.join(scan_dir, file)
         if os.path.isdir(path):
@@ -15,15 +42,18 @@ def make_configs(target_dir: str, scan_dir: str):
             if ext == ".json":
                 conf = Splitter(dict_=json.loads(f.read()))
 
-        if not master_conf:
+        # an empty intersection stays empty, it must not restart the fold
+        if master_conf is None:
             master_conf = conf
         else:
             master_conf = master_conf ^ conf
 
-    # save master config
-    with open(os.path.join(target_dir, "master.json"), "w") as mf:
+    if master_conf is None:
+        master_conf = Splitter(dict_={})
 
-        mf.write(json.dumps(master_conf.as_dict()))
+    # save master config
+    master_path = os.path.join(target_dir, "master.json")
+    write_json(master_conf, master_path, use_orjson=use_orjson)
 
     for file in os.listdir(scan_dir):
         path = os.path.join(scan_dir, file)
@@ -36,5 +66,114 @@ def make_configs(target_dir: str, scan_dir: str):
                 conf = Splitter(dict_=json.loads(f.read()))
 
         conf = conf - master_conf
-        with open(os.path.join(target_dir, file), "w") as cf:
-            cf.write(json.dumps(conf.as_dict()))
+        residuals.put(file, conf)
+    residuals.save()
+
+
+def _json_files(scan_dir: str) -> ty.List[str]:
+    return sorted(
+        file
+        for file in os.listdir(scan_dir)
+        if Path(file).suffix == ".json" and os.path.isfile(os.path.join(scan_dir, file))
+    )
+
+
+def _spill(lines: ty.List[str], runs_dir: str, runs: ty.List[str]) -> None:
+    lines.sort()
+    path = os.path.join(runs_dir, f"run{len(runs)}")
+    with open(path, "w") as f:
+        f.writelines(lines)
+    runs.append(path)
+    lines.clear()
+
+
+def _merge(runs: ty.List[str], runs_dir: str) -> ty.Iterator[str]:
+    """Merges sorted run files, reducing them in several passes if needed"""
+    while len(runs) > MERGE_FAN_IN:
+        merged = []
+        for start in range(0, len(runs), MERGE_FAN_IN):
+            batch = runs[start:start + MERGE_FAN_IN]
+            path = os.path.join(runs_dir, f"merged{len(merged)}-{len(runs)}")
+            files = [open(run, "r") for run in batch]
+            try:
+                with open(path, "w") as f:
+                    f.writelines(heapq.merge(*files))
+            finally:
+                for run_file in files:
+                    run_file.close()
+            for run in batch:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+
+    files = [open(run, "r") for run in runs]
+    try:
+        yield from heapq.merge(*files)
+    finally:
+        for run_file in files:
+            run_file.close()
+
+
+def _make_configs_external(
+    target_dir: str,
+    scan_dir: str,
+    memory_limit: int,
+    residuals: ty.Union[PlainResiduals, ResidualStore],
+    use_orjson: bool = False,
+):
+    """
+    Same as `make_configs`, but keeps at most about `memory_limit` bytes of
+    per-path occurrence records in memory. Records are spilled to sorted
+    run files inside `target_dir` and counted with an external merge, so
+    only one input config is loaded at a time
+    """
+    files = _json_files(scan_dir)
+    runs_dir = tempfile.mkdtemp(dir=target_dir, prefix=".runs-")
+    try:
+        runs: ty.List[str] = []
+        lines: ty.List[str] = []
+        size = 0
+        for file in files:
+            with open(os.path.join(scan_dir, file), "r") as f:
+                conf = Splitter(dict_=json.loads(f.read()))
+            for k, v in conf.items():
+                line = f"{json.dumps(k)}\t{json.dumps(v, sort_keys=True)}\n"
+                lines.append(line)
+                size += sys.getsizeof(line) + 8
+                if size >= memory_limit:
+                    _spill(lines, runs_dir, runs)
+                    size = 0
+        if lines:
+            _spill(lines, runs_dir, runs)
+
+        # every file has a path at most once, so a (path, value) record
+        # seen in every file belongs to the master config
+        master: ty.Dict[ty.Tuple[str, ...], ty.Any] = {}
+        previous, count = None, 0
+        for line in _merge(runs, runs_dir):
+            if line != previous:
+                previous, count = line, 0
+            count += 1
+            if count == len(files):
+                k, v = line.rstrip("\n").split("\t")
+                master[tuple(json.loads(k))] = json.loads(v)
+    finally:
+        shutil.rmtree(runs_dir)
+
+    master_conf = Splitter.from_items(
+        sorted(master.items(), key=lambda item: path_key(item[0]))
+    )
+    master_path = os.path.join(target_dir, "master.json")
+    write_json(master_conf, master_path, use_orjson=use_orjson)
+
+    for file in files:
+        with open(os.path.join(scan_dir, file), "r") as f:
+            conf = Splitter(dict_=json.loads(f.read()))
+        conf = Splitter.from_items(
+            (k, v)
+            for k, v in conf.items()
+            if k not in master
+            or json.dumps(master[k], sort_keys=True) != json.dumps(v, sort_keys=True)
+        )
+        residuals.put(file, conf)
+    residuals.save()
@@ -1,7 +1,11 @@
 import copy
 import typing as ty
+from functools import lru_cache
 from collections.abc import MutableMapping
 
+from vocab import streams
+from vocab.trie import ANY, ANY_DEEP, ANY_POSITION, PathTrie
+
 _AT = ty.Union[list, bool, str, float, dict, int]
 _UT = ty.Union[int, float, str, bool]
 _KT = ty.List[ty.Tuple[str, ...]]
@@ -10,11 +14,35 @@ _IT = ty.List[ty.Tuple[ty.Tuple[str, ...], _AT]]
 
 Path = ty.Union[str, ty.Tuple[str, ...]]
 
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+_MISSING = object()
+
+
+class Change(ty.NamedTuple):
+    """Single difference between two configs"""
+    action: str
+    path: ty.Tuple[str, ...]
+    old: ty.Any = None
+    new: ty.Any = None
+
+
+def _same(first: ty.Any, second: ty.Any) -> bool:
+    """Leaf equality which tells apart `1`, `1.0` and `true`"""
+    return streams.value_key(first) == streams.value_key(second)
+
+
+@lru_cache(maxsize=4096)
+def split_path(path: str, delimiter: str) -> ty.Tuple[str, ...]:
+    return tuple(path.split(delimiter))
+
 
 def topath(func):
     def wrapper(obj, path, *args, **kwargs):
         if isinstance(path, str):
-            path = tuple([key for key in path.split(obj.kd)])
+            path = split_path(path, obj.kd)
         return func(obj, path, *args, **kwargs)
 
     return wrapper
@@ -29,6 +57,7 @@ class Splitter(MutableMapping):
         keys_delimiter: str = ".",
         list_delimiter: str = "*",
         convert_lists: bool = True,
+        sort_keys: bool = False,
     ):
         super().__init__()
 
@@ -40,11 +69,30 @@ class Splitter(MutableMapping):
         self.underlying = dict_
         self.kd = keys_delimiter
         self.ld = list_delimiter
+        self.sort_keys = sort_keys
         self.unconverted_types: ty.Tuple = (int, float, str, bool)
         if not convert_lists:
             self.unconverted_types += (list,)
 
     def __iter__(self, obj: _AT = None, path: Path = None) -> ty.Iterator:
+        if obj is None and path is None and self.is_flat():
+            yield from self._walk_flat(ordered=self.sort_keys)
+        else:
+            yield from self._walk(obj, path, ordered=self.sort_keys)
+
+    def is_flat(self) -> bool:
+        """Whether every top level value is a leaf"""
+        types = self.unconverted_types
+        return all(isinstance(v, types) for v in self.underlying.values())
+
+    def _walk_flat(self, ordered: bool) -> ty.Iterator:
+        keys = self.underlying
+        if ordered:
+            keys = sorted(keys, key=self.segment_key)
+        for k in keys:
+            yield (k,), self.underlying[k]
+
+    def _walk(self, obj: _AT, path: Path, ordered: bool) -> ty.Iterator:
         if obj is None:
             obj = self.underlying
         if path is None:
@@ -53,19 +101,28 @@ class Splitter(MutableMapping):
         if isinstance(obj, self.unconverted_types) or (not obj and path):
             yield path, obj
         elif isinstance(obj, MutableMapping):
-            for k, v in obj.items():
+            keys = sorted(obj, key=self.segment_key) if ordered else obj
+            for k in keys:
                 new_path = path + (k,)
-                yield from self.__iter__(v, path=new_path)
+                yield from self._walk(obj[k], new_path, ordered)
         elif isinstance(obj, list):
             for idx, item in enumerate(obj):
                 if item is not None:
                     pos = f"{self.ld}{idx}"
-                    yield from self.__iter__(item, path=path + (pos,))
+                    yield from self._walk(item, path + (pos,), ordered)
+
+    def segment_key(self, segment: str) -> ty.Tuple:
+        return streams.segment_key(segment, self.ld)
+
+    def path_key(self, path: ty.Tuple[str, ...]) -> ty.Tuple:
+        return streams.path_key(path, self.ld)
 
     @topath
     def __setitem__(self, path: Path, value: _AT) -> None:
         if len(path) == 1:
             self.underlying[path[0]] = value
+        elif not any(segment.startswith(self.ld) for segment in path):
+            self._dict_insert(path, value)
         else:
             if not path[1].startswith(self.ld):
                 item = self.underlying.get(path[0], self.__class__(dict_={}))
@@ -83,8 +140,31 @@ class Splitter(MutableMapping):
                     self.underlying.setdefault(path[0], []), path[1:], value
                 )
 
+    def _dict_insert(self, path: ty.Tuple[str, ...], value: _AT) -> None:
+        """
+        Sets a path made of dict keys only, descending in place instead of
+        rebuilding every dict on the way
+        """
+        obj = self.underlying
+        for idx, segment in enumerate(path[:-1]):
+            child = obj.get(segment)
+            if isinstance(child, self.__class__):
+                child[path[idx + 1:]] = value
+                obj[segment] = child.as_dict()
+                return
+            if not isinstance(child, dict):
+                child = obj[segment] = {}
+            obj = child
+        # empty containers are stored as leaves, they must not be shared
+        obj[path[-1]] = copy.deepcopy(value) if not value else value
+
     @topath
     def __delitem__(self, path: Path) -> None:
+        if self.is_flat():
+            if len(path) == 1:
+                self.underlying.pop(path[0], None)
+            return
+
         result = self.__class__(dict_={})
         for key, value in self:
             if key != path:
@@ -93,39 +173,309 @@ class Splitter(MutableMapping):
 
     @topath
     def __getitem__(self, path: Path) -> _AT:
-        value = None
-        for k, v in self:
-            if k == path:
-                value = v
-        if value is None:
-            raise KeyError
+        value = self.underlying
+        for segment in path:
+            value = self._child(value, segment)
+        if value is _MISSING or value is None or not path:
+            raise KeyError(path)
+        if not isinstance(value, self.unconverted_types) and value:
+            raise KeyError(path)
+        return value
+
+    @topath
+    def query(self, pattern: Path) -> ty.Iterator:
+        """
+        Yields `(path, value)` pairs matching a wildcard pattern,
+        e.g. `deployment.files.*.protocol` or `handlers.**`.
+        See `vocab.trie` for the pattern syntax.
+
+        The pattern is matched against the underlying tree directly, so
+        a query only visits the subtrees its segments lead to
+        """
+        matches = self._match(self.underlying, pattern, tuple())
+        if pattern.count(ANY_DEEP) < 2:
+            yield from matches
+            return
+
+        # several `**` may reach the same leaf in different ways
+        seen = set()
+        for path, value in matches:
+            if path not in seen:
+                seen.add(path)
+                yield path, value
+
+    def _children(self, obj: ty.Any) -> ty.Iterator:
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if v is not None:
+                    yield k, v
+        elif isinstance(obj, list) and not isinstance(obj, self.unconverted_types):
+            for idx, item in enumerate(obj):
+                if item is not None:
+                    yield f"{self.ld}{idx}", item
+
+    def _match(
+        self, obj: ty.Any, pattern: ty.Tuple[str, ...], path: ty.Tuple[str, ...]
+    ) -> ty.Iterator:
+        if not pattern:
+            if isinstance(obj, self.unconverted_types) or (not obj and path):
+                yield path, obj
+            return
+
+        head, rest = pattern[0], pattern[1:]
+        if head == ANY_DEEP:
+            yield from self._match(obj, rest, path)
+            for segment, child in self._children(obj):
+                yield from self._match(child, pattern, path + (segment,))
+        elif head == ANY:
+            for segment, child in self._children(obj):
+                yield from self._match(child, rest, path + (segment,))
+        elif head == f"{self.ld}{ANY_POSITION}":
+            if isinstance(obj, list):
+                for segment, child in self._children(obj):
+                    yield from self._match(child, rest, path + (segment,))
         else:
-            return value
+            child = self._child(obj, head)
+            if child is not _MISSING and child is not None:
+                yield from self._match(child, rest, path + (head,))
+
+    def index(self) -> PathTrie:
+        """
+        Snapshot of the current paths as a `PathTrie`, e.g. to keep
+        querying a config which is about to be changed
+        """
+        return PathTrie(self, list_delimiter=self.ld)
+
+    def get_many(
+        self, paths: ty.Iterable[Path], default: ty.Any = None
+    ) -> ty.List[_AT]:
+        """
+        Returns values of several paths at once, in the given order.
+        Paths are sorted first, so shared prefixes are walked only once
+        and list positions are resolved by index
+        """
+        paths = [self._to_path(path) for path in paths]
+        order = sorted(range(len(paths)), key=lambda i: self.path_key(paths[i]))
+        result = [default] * len(paths)
+
+        previous: ty.Tuple[str, ...] = tuple()
+        # stack[i] is the object found at previous[:i]
+        stack: ty.List[ty.Any] = [self.underlying]
+        for i in order:
+            path = paths[i]
+            common = self._common_prefix(previous, path)
+            del stack[common + 1:]
+            for segment in path[common:]:
+                stack.append(self._child(stack[-1], segment))
+            previous = path
+
+            value = stack[-1]
+            if value is _MISSING or value is None or not path:
+                continue
+            if isinstance(value, self.unconverted_types) or not value:
+                result[i] = value
+        return result
+
+    def set_many(self, mapping: ty.Mapping[Path, _AT]) -> None:
+        """
+        Sets several paths at once. Paths are sorted first, so shared
+        prefixes are walked only once and lists are filled in order
+        """
+        items = sorted(
+            ((self._to_path(k), v) for k, v in mapping.items()),
+            key=lambda item: self.path_key(item[0]),
+        )
+
+        previous: ty.Tuple[str, ...] = tuple()
+        # stack[i] is the container found at previous[:i]
+        stack: ty.List[ty.Any] = [self.underlying]
+        for path, value in items:
+            common = self._common_prefix(previous[:-1], path[:-1])
+            del stack[common + 1:]
+            for idx in range(common, len(path) - 1):
+                stack.append(
+                    self._ensure_child(stack[-1], path[idx], path[idx + 1])
+                )
+            previous = path
+
+            container, segment = stack[-1], path[-1]
+            if isinstance(container, list):
+                pos = int(segment[len(self.ld):])
+                if pos < len(container):
+                    container[pos] = value
+                else:
+                    container.append(value)
+            else:
+                container[segment] = value
+
+    def _to_path(self, path: Path) -> ty.Tuple[str, ...]:
+        if isinstance(path, str):
+            return split_path(path, self.kd)
+        return tuple(path)
+
+    @staticmethod
+    def _common_prefix(first: ty.Tuple, second: ty.Tuple) -> int:
+        common, limit = 0, min(len(first), len(second))
+        while common < limit and first[common] == second[common]:
+            common += 1
+        return common
+
+    def _is_position(self, segment: str) -> bool:
+        return segment.startswith(self.ld) and segment[len(self.ld):].isdigit()
+
+    def _child(self, obj: ty.Any, segment: str) -> ty.Any:
+        if isinstance(obj, dict):
+            return obj.get(segment, _MISSING)
+        if (
+            isinstance(obj, list)
+            and not isinstance(obj, self.unconverted_types)
+            and self._is_position(segment)
+        ):
+            pos = int(segment[len(self.ld):])
+            return obj[pos] if pos < len(obj) else _MISSING
+        return _MISSING
+
+    def _ensure_child(self, obj: ty.Any, segment: str, next_segment: str) -> ty.Any:
+        """Returns a container at `segment`, replacing scalars if needed"""
+        type_ = list if self._is_position(next_segment) else dict
+        if isinstance(obj, list):
+            pos = int(segment[len(self.ld):])
+            if pos >= len(obj):
+                obj.append(type_())
+                return obj[-1]
+            if not isinstance(obj[pos], type_):
+                obj[pos] = type_()
+            return obj[pos]
+
+        if not isinstance(obj.get(segment), type_):
+            obj[segment] = type_()
+        return obj[segment]
 
     def __sub__(self, other: "Splitter") -> "Splitter":
-        new_ = self.__class__(dict_={})
-        for k, v in self:
-            if k in other.keys() and other[k] == v:
+        return self.__class__(
+            dict_=self._subtract(self.underlying, other.underlying)
+        )
+
+    def __xor__(self, other: "Splitter") -> "Splitter":
+        return self.__class__(
+            dict_=self._intersect(self.underlying, other.underlying)
+        )
+
+    def _is_leaf(self, obj: ty.Any) -> bool:
+        return isinstance(obj, self.unconverted_types) or not obj
+
+    def _has_list(self, *objs: ty.Any) -> bool:
+        return any(
+            isinstance(obj, list) and not self._is_leaf(obj) for obj in objs
+        )
+
+    def _subtract(self, ours: dict, theirs: ty.Any) -> dict:
+        """
+        Leaves of `ours` which `theirs` doesn't have under the same path.
+        Nested dicts are walked side by side, so shared subtrees are never
+        flattened; keys holding lists go through `_operate`
+        """
+        if not isinstance(theirs, dict):
+            theirs = {}
+
+        result = {}
+        for k, v in ours.items():
+            other = theirs.get(k, _MISSING)
+            if self._has_list(v, other):
+                kept = self._operate(k, v, other, self.__class__._subtract_items)
+                if kept is not _MISSING:
+                    result[k] = kept
+            elif self._is_leaf(v):
+                if other is _MISSING or not self._is_leaf(other) or not _same(other, v):
+                    result[k] = copy.deepcopy(v) if not v else v
+            else:
+                kept = self._subtract(v, other)
+                if kept:
+                    result[k] = kept
+        return result
+
+    def _intersect(self, ours: dict, theirs: dict) -> dict:
+        """Leaves equal in both trees, in the order of `theirs`"""
+        result = {}
+        for k, v in theirs.items():
+            if k not in ours:
                 continue
-            new_[k] = v
+            own = ours[k]
+            if self._has_list(own, v):
+                kept = self._operate(k, own, v, self.__class__._intersect_items)
+                if kept is not _MISSING:
+                    result[k] = kept
+            elif self._is_leaf(own) or self._is_leaf(v):
+                if self._is_leaf(own) and self._is_leaf(v) and _same(own, v):
+                    result[k] = copy.deepcopy(v) if not v else v
+            else:
+                kept = self._intersect(own, v)
+                if kept:
+                    result[k] = kept
+        return result
 
+    def _operate(
+        self, key: str, ours: ty.Any, theirs: ty.Any, operator: ty.Callable
+    ) -> ty.Any:
+        """Applies a path-by-path `operator` to a single key holding lists"""
+        first, second = copy.copy(self), copy.copy(self)
+        first.underlying = {} if ours is _MISSING else {key: ours}
+        second.underlying = {} if theirs is _MISSING else {key: theirs}
+        return operator(first, second).underlying.get(key, _MISSING)
+
+    def _subtract_items(self, other: "Splitter") -> "Splitter":
+        theirs = dict(other.items())
+        new_ = self.__class__(dict_={}, list_delimiter=self.ld)
+        new_.set_many(
+            {k: v for k, v in self if k not in theirs or not _same(theirs[k], v)}
+        )
         return new_
 
-    def __xor__(self, other: "Splitter") -> "Splitter":
-        new_ = self.__class__(dict_={})
-        for k, v in other:
-            if k in self.keys() and self[k] == v:
-                new_[k] = v
+    def _intersect_items(self, other: "Splitter") -> "Splitter":
+        ours = dict(self.items())
+        new_ = self.__class__(dict_={}, list_delimiter=self.ld)
+        new_.set_many({k: v for k, v in other if k in ours and _same(ours[k], v)})
         return new_
 
     def __add__(self, other: "Splitter") -> "Splitter":
-        new_ = copy.deepcopy(self)
+        if self.is_flat() and list not in self.unconverted_types:
+            # values are immutable, a shallow copy is enough
+            new_ = copy.copy(self)
+            new_.underlying = dict(self.underlying)
+        else:
+            new_ = copy.deepcopy(self)
+
+        if other.is_flat():
+            # top level leaves simply replace whatever is stored under the key
+            values = other.underlying
+            if list in other.unconverted_types:
+                values = copy.deepcopy(values)
+            new_.underlying.update(values)
+            return new_
+
         for k, v in other:
             if v is not None:
                 new_[k] = v
         return new_
 
+    def diff(self, other: "Splitter") -> ty.Iterator[Change]:
+        """
+        Lazily yields changes which turn this config into `other`.
+        Both configs are walked in sorted order and merge-joined,
+        so only the current branch of each tree is kept in memory
+        """
+        pairs = streams.join(self.sorted_items(), other.sorted_items(), self.ld)
+        for old, new in pairs:
+            if new is None:
+                yield Change(REMOVED, old[0], old=old[1])
+            elif old is None:
+                yield Change(ADDED, new[0], new=new[1])
+            elif streams.value_key(old[1]) != streams.value_key(new[1]):
+                yield Change(CHANGED, old[0], old=old[1], new=new[1])
+
     def __len__(self) -> int:
+        if self.is_flat():
+            return len(self.underlying)
         return len(self.keys())
 
     def __repr__(self) -> str:
@@ -198,3 +548,15 @@ class Splitter(MutableMapping):
 
     def items(self):
         yield from self.__iter__()
+
+    def sorted_items(self) -> ty.Iterator:
+        """Yields items in canonical path order, see `path_key`"""
+        yield from self._walk(None, None, ordered=True)
+
+    @classmethod
+    def from_items(cls, items: ty.Iterable, **kwargs) -> "Splitter":
+        """Builds a new instance from a stream of `(path, value)` pairs"""
+        new_ = cls(dict_={}, **kwargs)
+        for k, v in items:
+            new_[k] = v
+        return new_
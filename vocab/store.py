@@ -0,0 +1,194 @@
+"""
+Residual storage inside the `.vocab` directory.
+
+By default every residual is written as `<name>.json` next to
+`master.json`. With deduplication residuals are content addressed:
+
+    .store/blobs/<sha256>.json[.gz|.zst]   serialized residual, stored once
+    .store/index.json                      {"<name>": "<blob file name>"}
+
+Residuals are named after the scanned `*.json` files, so none of them
+can clash with the `.store` directory. `master.json` is the only name
+scanned files can't have.
+
+so byte-identical residuals (e.g. empty ones of files equal to the
+master config) take the space of a single blob.
+"""
+import io
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import typing as ty
+
+from vocab.splitter import Splitter
+from vocab.writer import atomic_open, dump, write_json
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+STORE_DIR = ".store"
+BLOBS_DIR = os.path.join(STORE_DIR, "blobs")
+INDEX = os.path.join(STORE_DIR, "index.json")
+
+RESERVED = ("master.json",)
+
+GZIP = "gzip"
+ZSTD = "zstd"
+COMPRESSIONS = (GZIP, ZSTD)
+
+_EXTENSIONS = {None: ".json", GZIP: ".json.gz", ZSTD: ".json.zst"}
+
+
+def _compress(data: bytes, compression: ty.Optional[str]) -> bytes:
+    if compression == GZIP:
+        # fixed mtime keeps blobs of equal residuals byte-identical
+        return gzip.compress(data, mtime=0)
+    if compression == ZSTD:
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data: bytes, blob: str) -> bytes:
+    if blob.endswith(_EXTENSIONS[GZIP]):
+        return gzip.decompress(data)
+    if blob.endswith(_EXTENSIONS[ZSTD]):
+        if zstandard is None:
+            raise ValueError(f"Package `zstandard` is required to read {blob}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+
+def check_names(names: ty.Iterable[str]) -> None:
+    """Rejects scanned files whose residual would replace the master config"""
+    clashing = sorted(set(names).intersection(RESERVED))
+    if clashing:
+        raise ValueError(
+            f"Config files can't be named {', '.join(clashing)}, "
+            "the name is reserved for the structured output"
+        )
+
+
+class PlainResiduals:
+    """Writes every residual to its own JSON file"""
+
+    def __init__(self, target_dir: str, use_orjson: bool = False):
+        self.target_dir = target_dir
+        self.use_orjson = use_orjson
+
+    def put(self, name: str, conf: Splitter) -> None:
+        path = os.path.join(self.target_dir, name)
+        write_json(conf, path, use_orjson=self.use_orjson)
+
+    def save(self) -> None:
+        # drop the index of a previous deduplicated run, so readers
+        # don't pick up stale residuals
+        shutil.rmtree(os.path.join(self.target_dir, STORE_DIR), ignore_errors=True)
+
+
+class ResidualStore:
+    """Content addressed residual storage with optional compression"""
+
+    def __init__(
+        self,
+        target_dir: str,
+        compression: ty.Optional[str] = None,
+        use_orjson: bool = False,
+    ):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression `{compression}`, expected one of {COMPRESSIONS}"
+            )
+        if compression == ZSTD and zstandard is None:
+            raise ValueError("Package `zstandard` is required for zstd compression")
+
+        self.target_dir = target_dir
+        self.compression = compression
+        # blob names hash the serialized bytes, so they depend on the encoder
+        self.use_orjson = use_orjson
+        self.blobs_dir = os.path.join(target_dir, BLOBS_DIR)
+        self.index: ty.Dict[str, str] = {}
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    def put(self, name: str, conf: Splitter) -> None:
+        buffer = io.BytesIO()
+        dump(conf, buffer, use_orjson=self.use_orjson)
+        data = buffer.getvalue()
+
+        blob = hashlib.sha256(data).hexdigest() + _EXTENSIONS[self.compression]
+        path = os.path.join(self.blobs_dir, blob)
+        if not os.path.exists(path):
+            with atomic_open(path) as fp:
+                fp.write(_compress(data, self.compression))
+        self.index[name] = blob
+
+    def save(self) -> None:
+        """Writes the index and removes blobs no longer referenced"""
+        with atomic_open(os.path.join(self.target_dir, INDEX)) as fp:
+            fp.write(json.dumps(self.index, sort_keys=True).encode("utf-8"))
+
+        used = set(self.index.values())
+        for blob in os.listdir(self.blobs_dir):
+            if blob not in used:
+                os.remove(os.path.join(self.blobs_dir, blob))
+
+        # drop plain residuals of a previous run, they are superseded
+        # by the index
+        for name in os.listdir(self.target_dir):
+            path = os.path.join(self.target_dir, name)
+            if name in RESERVED or not name.endswith(".json"):
+                continue
+            if os.path.isfile(path):
+                os.remove(path)
+
+
+def open_residuals(
+    target_dir: str,
+    dedupe: bool = False,
+    compression: ty.Optional[str] = None,
+    use_orjson: bool = False,
+) -> ty.Union[PlainResiduals, ResidualStore]:
+    if dedupe or compression is not None:
+        return ResidualStore(
+            target_dir, compression=compression, use_orjson=use_orjson
+        )
+    return PlainResiduals(target_dir, use_orjson=use_orjson)
+
+
+def _read_index(target_dir: str) -> ty.Optional[ty.Dict[str, str]]:
+    index_path = os.path.join(target_dir, INDEX)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, "r") as f:
+        return json.loads(f.read())
+
+
+def residual_names(target_dir: str) -> ty.List[str]:
+    """Names of all stored residuals, of either storage layout"""
+    index = _read_index(target_dir)
+    if index is not None:
+        return sorted(index)
+    return sorted(
+        name
+        for name in os.listdir(target_dir)
+        if name not in RESERVED
+        and name.endswith(".json")
+        and os.path.isfile(os.path.join(target_dir, name))
+    )
+
+
+def load_residuals(target_dir: str) -> ty.Iterator[ty.Tuple[str, Splitter]]:
+    """Yields `(name, residual)` pairs of either storage layout"""
+    index = _read_index(target_dir)
+    for name in residual_names(target_dir):
+        if index is not None:
+            blob = index[name]
+            with open(os.path.join(target_dir, BLOBS_DIR, blob), "rb") as f:
+                data = _decompress(f.read(), blob)
+        else:
+            with open(os.path.join(target_dir, name), "rb") as f:
+                data = f.read()
+        yield name, Splitter(dict_=json.loads(data))
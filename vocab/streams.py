@@ -0,0 +1,107 @@
+"""
+Merge-join operators over sorted streams of `(path, value)` pairs.
+
+Streams must be ordered by `path_key`, which is what
+`Splitter.sorted_items` produces. Every operator consumes both streams
+exactly once and keeps only the current pair of items in memory.
+"""
+import json
+import typing as ty
+from functools import partial
+
+_Item = ty.Tuple[ty.Tuple[str, ...], ty.Any]
+_Stream = ty.Iterable[_Item]
+
+_END = object()
+
+
+def value_key(value: ty.Any) -> ty.Hashable:
+    """
+    Type-aware identity of a leaf value. Unlike `==` it tells apart
+    `1`, `1.0` and `true`, which are different values in a config file
+    """
+    type_ = type(value)
+    if type_ in (str, int, bool) or value is None:
+        return type_, value
+    if type_ is float:
+        # repr keeps NaN equal to itself
+        return type_, repr(value)
+    return type_, json.dumps(value, sort_keys=True)
+
+
+def segment_key(segment: str, list_delimiter: str = "*") -> ty.Tuple:
+    """
+    Sort key for a single path segment. List positions (`*N`) are
+    ordered numerically and go before regular keys
+    """
+    position = segment[len(list_delimiter):]
+    if segment.startswith(list_delimiter) and position.isdigit():
+        return 0, int(position), segment
+    return 1, 0, segment
+
+
+def path_key(path: ty.Tuple[str, ...], list_delimiter: str = "*") -> ty.Tuple:
+    """Canonical sort key for a full path"""
+    return tuple(segment_key(segment, list_delimiter) for segment in path)
+
+
+def join(
+    left: _Stream, right: _Stream, list_delimiter: str = "*"
+) -> ty.Iterator[ty.Tuple[ty.Optional[_Item], ty.Optional[_Item]]]:
+    """
+    Aligns two sorted streams by path. Yields `(left_item, right_item)`
+    pairs where the missing side is `None`
+    """
+    key = partial(path_key, list_delimiter=list_delimiter)
+    left, right = iter(left), iter(right)
+    l_item, r_item = next(left, _END), next(right, _END)
+    while l_item is not _END or r_item is not _END:
+        if r_item is _END:
+            yield l_item, None
+            l_item = next(left, _END)
+        elif l_item is _END:
+            yield None, r_item
+            r_item = next(right, _END)
+        else:
+            l_key, r_key = key(l_item[0]), key(r_item[0])
+            if l_key < r_key:
+                yield l_item, None
+                l_item = next(left, _END)
+            elif r_key < l_key:
+                yield None, r_item
+                r_item = next(right, _END)
+            else:
+                yield l_item, r_item
+                l_item, r_item = next(left, _END), next(right, _END)
+
+
+def intersect(
+    left: _Stream, right: _Stream, list_delimiter: str = "*"
+) -> ty.Iterator[_Item]:
+    """Streaming version of `Splitter.__xor__`"""
+    for l_item, r_item in join(left, right, list_delimiter):
+        if l_item is not None and r_item is not None and l_item[1] == r_item[1]:
+            yield r_item
+
+
+def subtract(
+    left: _Stream, right: _Stream, list_delimiter: str = "*"
+) -> ty.Iterator[_Item]:
+    """Streaming version of `Splitter.__sub__`"""
+    for l_item, r_item in join(left, right, list_delimiter):
+        if l_item is None:
+            continue
+        if r_item is not None and l_item[1] == r_item[1]:
+            continue
+        yield l_item
+
+
+def merge(
+    left: _Stream, right: _Stream, list_delimiter: str = "*"
+) -> ty.Iterator[_Item]:
+    """Streaming version of `Splitter.__add__`"""
+    for l_item, r_item in join(left, right, list_delimiter):
+        if r_item is not None and r_item[1] is not None:
+            yield r_item
+        elif l_item is not None:
+            yield l_item
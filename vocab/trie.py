@@ -0,0 +1,77 @@
+"""
+Prefix tree over flattened config paths with wildcard queries.
+
+Pattern segments:
+    `*`        - exactly one segment, either a key or a list position
+    `**`       - any number of segments, including none
+    `<ld>#`    - exactly one list position, e.g. `*#` for the default
+                 list delimiter
+Anything else matches a segment literally.
+"""
+import typing as ty
+
+ANY = "*"
+ANY_DEEP = "**"
+ANY_POSITION = "#"
+
+_LEAF = object()
+
+
+class PathTrie:
+    """Prefix tree built from `(path, value)` pairs"""
+
+    def __init__(self, items: ty.Iterable = (), list_delimiter: str = "*"):
+        self.root: ty.Dict = {}
+        self.ld = list_delimiter
+        for path, value in items:
+            self.insert(path, value)
+
+    def insert(self, path: ty.Tuple[str, ...], value: ty.Any) -> None:
+        node = self.root
+        for segment in path:
+            node = node.setdefault(segment, {})
+        node[_LEAF] = value
+
+    def query(self, pattern: ty.Tuple[str, ...]) -> ty.Iterator:
+        """Yields `(path, value)` pairs of all leaves matching the pattern"""
+        pattern = tuple(pattern)
+        matches = self._match(self.root, pattern, tuple())
+        if pattern.count(ANY_DEEP) < 2:
+            yield from matches
+            return
+
+        # several `**` may reach the same leaf in different ways
+        seen = set()
+        for path, value in matches:
+            if path not in seen:
+                seen.add(path)
+                yield path, value
+
+    def _is_position(self, segment: str) -> bool:
+        return segment.startswith(self.ld) and segment[len(self.ld):].isdigit()
+
+    def _children(self, node: ty.Dict) -> ty.Iterator:
+        return ((k, v) for k, v in node.items() if k is not _LEAF)
+
+    def _match(
+        self, node: ty.Dict, pattern: ty.Tuple[str, ...], path: ty.Tuple[str, ...]
+    ) -> ty.Iterator:
+        if not pattern:
+            if _LEAF in node:
+                yield path, node[_LEAF]
+            return
+
+        head, rest = pattern[0], pattern[1:]
+        if head == ANY_DEEP:
+            yield from self._match(node, rest, path)
+            for segment, child in self._children(node):
+                yield from self._match(child, pattern, path + (segment,))
+        elif head == ANY:
+            for segment, child in self._children(node):
+                yield from self._match(child, rest, path + (segment,))
+        elif head == f"{self.ld}{ANY_POSITION}":
+            for segment, child in self._children(node):
+                if self._is_position(segment):
+                    yield from self._match(child, rest, path + (segment,))
+        elif head in node:
+            yield from self._match(node[head], rest, path + (head,))
@@ -0,0 +1,272 @@
+"""
+Watch mode for `vocab struct`.
+
+Keeps per-path occurrence counts of every scanned file in memory, so that
+a change of a single file only rewrites the master config and the
+residuals which are actually affected by it.
+"""
+import os
+import json
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import typing as ty
+
+from vocab.splitter import Splitter
+from vocab.store import INDEX, PlainResiduals, check_names
+from vocab.streams import value_key
+from vocab.writer import write_json
+
+_Flat = ty.Dict[ty.Tuple[str, ...], ty.Any]
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0x00000800
+
+_EVENT = struct.Struct("iIII")
+_MISSING = object()
+
+
+class Structure:
+    """Incrementally maintained master config and residuals"""
+
+    def __init__(self):
+        self.files: ty.Dict[str, _Flat] = {}
+        # path -> JSON encoded value -> [number of files, value]
+        self.counts: ty.Dict[ty.Tuple[str, ...], ty.Dict[str, ty.List]] = {}
+        self.master: _Flat = {}
+        # whether the master config has changed since it was last built
+        self.master_changed = False
+
+    def update(self, name: str, conf: ty.Optional[Splitter]) -> ty.Set[str]:
+        """
+        Replaces (or removes, if `conf` is None) a single file and
+        returns names of files whose residuals have changed
+        """
+        existed = name in self.files
+        old = self.files.pop(name, {})
+        new = dict(conf.items()) if conf is not None else {}
+        for path, value in old.items():
+            self._count(path, value, -1)
+        for path, value in new.items():
+            self._count(path, value, 1)
+        if conf is not None:
+            self.files[name] = new
+
+        if existed == (conf is not None):
+            touched = set(old) | set(new)
+        else:
+            # number of files has changed, so has the master threshold
+            touched = set(self.counts) | set(old)
+        changed = self._update_master(touched)
+        self.master_changed = self.master_changed or bool(changed)
+
+        affected = {name} if conf is not None else set()
+        for other, flat in self.files.items():
+            if other not in affected and any(path in flat for path in changed):
+                affected.add(other)
+        return affected
+
+    def _count(self, path: ty.Tuple[str, ...], value: ty.Any, delta: int) -> None:
+        values = self.counts.setdefault(path, {})
+        entry = values.setdefault(value_key(value), [0, value])
+        entry[0] += delta
+        if not entry[0]:
+            del values[value_key(value)]
+            if not values:
+                del self.counts[path]
+
+    def _update_master(self, paths: ty.Iterable) -> ty.Set[ty.Tuple[str, ...]]:
+        changed = set()
+        total = len(self.files)
+        for path in paths:
+            old = self.master.pop(path, _MISSING)
+            new = _MISSING
+            for count, value in self.counts.get(path, {}).values():
+                if count == total:
+                    new = value
+                    self.master[path] = value
+            if old is not new and (
+                old is _MISSING or new is _MISSING or value_key(old) != value_key(new)
+            ):
+                changed.add(path)
+        return changed
+
+    def master_config(self) -> Splitter:
+        self.master_changed = False
+        master = Splitter(dict_={})
+        master.set_many(self.master)
+        return master
+
+    def residual(self, name: str) -> Splitter:
+        master = self.master
+        residual = Splitter(dict_={})
+        residual.set_many(
+            {
+                path: value
+                for path, value in self.files[name].items()
+                if path not in master or value_key(master[path]) != value_key(value)
+            }
+        )
+        return residual
+
+
+class PollingWatcher:
+    """Detects changes by comparing `os.scandir` mtimes"""
+
+    def __init__(self, directory: str, interval: float = 0.1):
+        self.directory = directory
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> ty.Dict[str, ty.Tuple[int, int]]:
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: ty.Optional[float] = None) -> ty.Set[str]:
+        started = time.monotonic()
+        interval = self.interval if timeout is None else min(self.interval, timeout)
+        while True:
+            time.sleep(interval)
+            snapshot = self._scan()
+            changed = {
+                name
+                for name in set(snapshot) | set(self.snapshot)
+                if snapshot.get(name) != self.snapshot.get(name)
+            }
+            self.snapshot = snapshot
+            if changed:
+                return changed
+            if timeout is not None and time.monotonic() - started >= timeout:
+                return changed
+
+
+class InotifyWatcher:
+    """Detects changes with Linux inotify, called through ctypes"""
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+        mask |= IN_CREATE | IN_DELETE
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout: ty.Optional[float] = None) -> ty.Set[str]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                changed.add(os.fsdecode(name))
+        return changed
+
+
+def get_watcher(directory: str):
+    try:
+        return InotifyWatcher(directory)
+    except (OSError, AttributeError, TypeError):
+        return PollingWatcher(directory)
+
+
+def _load(path: str) -> ty.Optional[Splitter]:
+    """Reads a config, returns None if the file has been removed"""
+    try:
+        with open(path, "r") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    return Splitter(dict_=json.loads(data))
+
+
+def _is_config(name: str) -> bool:
+    return name.endswith(".json") and not name.startswith(".")
+
+
+def _apply(
+    structure: Structure,
+    target_dir: str,
+    scan_dir: str,
+    names: ty.Iterable[str],
+    force: bool = False,
+    use_orjson: bool = False,
+) -> None:
+    affected = set()
+    for name in names:
+        try:
+            check_names((name,))
+            conf = _load(os.path.join(scan_dir, name))
+        except (ValueError, TypeError, OSError) as e:
+            # most likely the file is being saved right now, or it is not
+            # a config at all; keep watching either way
+            print(f"Skipping {name}: {e}")
+            continue
+        affected |= structure.update(name, conf)
+        if conf is None and os.path.exists(os.path.join(target_dir, name)):
+            os.remove(os.path.join(target_dir, name))
+
+    if force or structure.master_changed:
+        master_path = os.path.join(target_dir, "master.json")
+        write_json(structure.master_config(), master_path, use_orjson=use_orjson)
+    residuals = PlainResiduals(target_dir, use_orjson=use_orjson)
+    for name in affected:
+        residuals.put(name, structure.residual(name))
+
+
+def watch(
+    target_dir: str,
+    scan_dir: str,
+    debounce: float = 0.05,
+    use_orjson: bool = False,
+) -> None:
+    """Structures the directory and keeps the output up to date"""
+    if os.path.exists(os.path.join(target_dir, INDEX)):
+        raise ValueError(
+            f"{target_dir} holds deduplicated residuals, which watch mode "
+            "doesn't update. Rerun `vocab struct` without `--dedupe` first"
+        )
+    structure = Structure()
+    watcher = get_watcher(scan_dir)
+    names = sorted(filter(_is_config, os.listdir(scan_dir)))
+    check_names(names)
+    _apply(structure, target_dir, scan_dir, names, force=True, use_orjson=use_orjson)
+    print(f"Watching {os.path.abspath(scan_dir)}")
+
+    while True:
+        changed = watcher.wait()
+        # collect the whole burst of events before regenerating
+        while True:
+            more = watcher.wait(debounce)
+            if not more:
+                break
+            changed |= more
+
+        names = sorted(filter(_is_config, changed))
+        if not names:
+            continue
+        started = time.monotonic()
+        _apply(structure, target_dir, scan_dir, names, use_orjson=use_orjson)
+        elapsed = (time.monotonic() - started) * 1000
+        print(f"Updated {', '.join(names)} in {elapsed:.0f} ms")